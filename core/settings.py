@@ -50,6 +50,16 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-x$$*6k_#o7=-+nd03--kot7=v6w0059ejbtw+8*x-n1w!0bs7d')
                        
+# Clave del HMAC con que se indexan los tokens de kiosco (Dispositivo.token_lookup).
+# Si cambia sin dejar la anterior en DISPOSITIVO_TOKEN_KEY_FALLBACKS, ningún
+# tablet vuelve a autenticar y hay que re-tatuarlos todos a mano (a diferencia
+# de una sesión, un dispositivo no "vuelve a loguearse"). Sin valor propio
+# sigue a SECRET_KEY, y entonces también acepta SECRET_KEY_FALLBACKS.
+DISPOSITIVO_TOKEN_KEY = os.getenv('DISPOSITIVO_TOKEN_KEY', '') or SECRET_KEY
+DISPOSITIVO_TOKEN_KEY_FALLBACKS = [
+    clave for clave in os.getenv('DISPOSITIVO_TOKEN_KEY_FALLBACKS', '').split(',') if clave
+]
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
@@ -165,6 +175,18 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Argon2id primero; el resto queda para verificar hashes viejos (PBKDF2 es el
+# default histórico) y re-hashearlos a Argon2 en el próximo login.
+PASSWORD_HASHERS = [
+    'sitrep.accounts.hashers.Argon2WebHasher',
+    'sitrep.accounts.hashers.Argon2PinHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
 
@@ -1,9 +1,33 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.hashers import identify_hasher
+from django.db.models import Q
+from django.utils.text import smart_split, unescape_string_literal
 
 from .models import Naviera, Usuario
 
 
+def _es_hash(valor):
+    """True si `valor` ya es un hash de algún PASSWORD_HASHERS (el form
+    reenvía pin_kiosco tal cual está guardado si no se tocó)."""
+    try:
+        identify_hasher(valor)
+    except ValueError:
+        return False
+    return True
+
+
+# Mismos prefijos que entiende el construct_search del admin de Django.
+_LOOKUP_POR_PREFIJO = {"^": "istartswith", "=": "iexact", "@": "search"}
+
+
+def _lookup_de_busqueda(campo):
+    """'=email' -> 'email__iexact'; sin prefijo cae en icontains."""
+    if campo[0] in _LOOKUP_POR_PREFIJO:
+        return f"{campo[1:]}__{_LOOKUP_POR_PREFIJO[campo[0]]}"
+    return f"{campo}__icontains"
+
+
 @admin.register(Usuario)
 class CustomUserAdmin(UserAdmin):
     fieldsets = UserAdmin.fieldsets + (
@@ -13,12 +37,30 @@ class CustomUserAdmin(UserAdmin):
         ("Contexto Multi-Tenant", {"fields": ("naviera", "rut", "rol", "pin_kiosco")}),
     )
     list_display = ("rut", "username", "naviera", "rol", "is_active")
-    search_fields = ("rut", "username", "email")
+    list_select_related = ("naviera",)
+    search_fields = ("rut", "username", "email", "naviera__nombre")
     list_filter = ("naviera", "rol", "is_active")
 
+    def get_search_results(self, request, queryset, search_term):
+        """Un pk__in por término en vez del filtro que arma el admin: con campos
+        a través de relaciones (naviera__nombre) cada término suma otro JOIN a
+        la query principal, y eso se multiplica a medida que crecen
+        search_fields. Acá los JOINs quedan dentro de cada subquery."""
+        if not search_term:
+            return queryset, False
+        lookups = [_lookup_de_busqueda(str(campo)) for campo in self.get_search_fields(request)]
+        for termino in smart_split(search_term):
+            if termino[0] in ('"', "'") and termino[0] == termino[-1]:
+                termino = unescape_string_literal(termino)
+            coincide = Q()
+            for lookup in lookups:
+                coincide |= Q(**{lookup: termino})
+            queryset = queryset.filter(pk__in=Usuario.objects.filter(coincide).values("pk"))
+        return queryset, False
+
     def save_model(self, request, obj, form, change):
         pin_raw = form.cleaned_data.get("pin_kiosco")
-        if pin_raw and not pin_raw.startswith("pbkdf2_"):
+        if pin_raw and not _es_hash(pin_raw):
             obj.set_pin(pin_raw)
         super().save_model(request, obj, form, change)
 
@@ -1,31 +1,170 @@
-﻿from django.contrib.auth import get_user_model
+﻿from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import verify_password
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
 
 from sitrep.fleet.models import Tripulacion
 from sitrep.fleet.services import FleetQueryService
 
 Usuario = get_user_model()
 
+# Un tablet de kiosco re-autentica el mismo (rut, pin) muchas veces por turno;
+# cada check_password/check_pin cuesta ~100ms de CPU. Solo se cachean los
+# aciertos, y por poco tiempo.
+CREDENCIAL_OK_TTL = 60
+
+# Pool dedicado para los hashers en aauthenticate: correrlos en el event loop
+# (o en el único thread de sync_to_async thread_sensitive) serializa todos los
+# logins concurrentes detrás de ~100ms de CPU cada uno.
+# Solo corre el hasher (CPU pura): nada de ORM en estos threads, que no pasan
+# por close_old_connections y dejarían una conexión abierta cada uno.
+CHECK_PASSWORD_EXECUTOR = ThreadPoolExecutor(16, thread_name_prefix="check-password")
+
+
+def _clave_credencial(usuario, tipo, raw, hash_guardado):
+    huella = salted_hmac(f"sitrep.accounts.backends.{tipo}", f"{raw}${hash_guardado}", algorithm="sha256")
+    return f"credencial_ok:{tipo}:{usuario.pk}:{huella.hexdigest()}"
+
+
+def _credencial_verificada(usuario, tipo, raw, hash_guardado, verificar):
+    """verificar(raw) con memo de aciertos en el cache de Django. La clave
+    incluye un HMAC de (raw, hash guardado): un set_pin/set_password cambia el
+    hash y deja la entrada vieja inalcanzable sin invalidar nada a mano. Los
+    fallos nunca se cachean — el costo del hasher sigue frenando fuerza bruta."""
+    if not hash_guardado:
+        return verificar(raw)
+    cache_key = _clave_credencial(usuario, tipo, raw, hash_guardado)
+    if cache.get(cache_key):
+        return True
+    if not verificar(raw):
+        return False
+    cache.set(cache_key, True, CREDENCIAL_OK_TTL)
+    return True
+
+
+_verify_password_en_pool = sync_to_async(
+    verify_password, thread_sensitive=False, executor=CHECK_PASSWORD_EXECUTOR
+)
+
+
+async def _credencial_verificada_async(usuario, tipo, raw, hash_guardado, preferred, rehashear):
+    """_credencial_verificada para aauthenticate. Al pool va solo
+    verify_password; si el hash quedó viejo, rehashear(usuario, raw) guarda el
+    nuevo por el sync_to_async thread-sensitive de siempre, con la conexión y
+    el ciclo de vida normales del request. Sin hash guardado (ej. tripulante
+    sin PIN todavía) no hay nada que verificar, igual que check_pin."""
+    if not hash_guardado:
+        return False
+    cache_key = _clave_credencial(usuario, tipo, raw, hash_guardado)
+    if await cache.aget(cache_key):
+        return True
+    password_ok, must_update = await _verify_password_en_pool(raw, hash_guardado, preferred)
+    if not password_ok:
+        return False
+    if must_update:
+        await sync_to_async(rehashear)(usuario, raw)
+    await cache.aset(cache_key, True, CREDENCIAL_OK_TTL)
+    return True
+
+
+def _rehashear_password(usuario, raw):
+    usuario.set_password(raw)
+    # Igual que el setter de AbstractBaseUser.check_password: un upgrade de
+    # hash no cuenta como cambio de password.
+    usuario._password = None
+    usuario.save(update_fields=["password"])
+
+
+def _rehashear_pin(usuario, raw):
+    usuario.set_pin(raw)
+    usuario.save(update_fields=["pin_kiosco"])
+
+
+# Columnas que el login realmente lee: los chequeos de abajo, más password
+# (login() firma la sesión con su hash) y username (Usuario.save lo revisa en
+# el update_last_login). Todo lo demás queda diferido. naviera no se
+# select_relatea: tanto acá como en login() solo se compara naviera_id.
+CAMPOS_LOGIN_WEB = ("id", "username", "password", "is_active", "rol", "naviera_id")
+CAMPOS_LOGIN_KIOSCO = CAMPOS_LOGIN_WEB + ("rut", "pin_kiosco")
+
+
+class _TenantModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        """request.user de cada request (el backend que autenticó queda en la
+        sesión) con su naviera ya unida: user.naviera no cuesta otra query."""
+        try:
+            usuario = Usuario._default_manager.select_related("naviera").get(pk=user_id)
+        except Usuario.DoesNotExist:
+            return None
+        return usuario if self.user_can_authenticate(usuario) else None
+
+    async def aget_user(self, user_id):
+        try:
+            usuario = await Usuario._default_manager.select_related("naviera").aget(pk=user_id)
+        except Usuario.DoesNotExist:
+            return None
+        return usuario if self.user_can_authenticate(usuario) else None
+
+
+class WebTenantBackend(_TenantModelBackend):
+    def _usuario_admitido(self, request, usuario):
+        """Chequeos baratos previos al hasher: tenant y rol. Compara ids para
+        no disparar una query lazy por usuario.naviera (prohibida en async)."""
+        naviera_id = getattr(getattr(request, "naviera", None), "id", None)
+        if not usuario.es_admin_sitrep_global and usuario.naviera_id != naviera_id:
+            return False
+        return usuario.rol != 'mar'
 
-class WebTenantBackend(ModelBackend):
     def authenticate(self, request, email=None, password=None, **kwargs):
         if not email or not password:
             return None
         try:
-            usuario = Usuario.objects.get(email=email)
+            usuario = Usuario.objects.only(*CAMPOS_LOGIN_WEB).get(email=email)
         except (Usuario.DoesNotExist, Usuario.MultipleObjectsReturned):
             return None
 
-        if not usuario.es_admin_sitrep_global and usuario.naviera != getattr(request, "naviera", None):
+        if not self._usuario_admitido(request, usuario):
             return None
-        if usuario.rol == 'mar':
+        password_ok = _credencial_verificada(
+            usuario, "password", password, usuario.password, usuario.check_password
+        )
+        if password_ok and self.user_can_authenticate(usuario):
+            return usuario
+        return None
+
+    async def aauthenticate(self, request, email=None, password=None, **kwargs):
+        if not email or not password:
+            return None
+        try:
+            usuario = await Usuario.objects.only(*CAMPOS_LOGIN_WEB).aget(email=email)
+        except (Usuario.DoesNotExist, Usuario.MultipleObjectsReturned):
             return None
-        if usuario.check_password(password) and self.user_can_authenticate(usuario):
+
+        if not self._usuario_admitido(request, usuario):
+            return None
+        password_ok = await _credencial_verificada_async(
+            usuario, "password", password, usuario.password, "default", _rehashear_password
+        )
+        if password_ok and self.user_can_authenticate(usuario):
             return usuario
         return None
 
 
-class KioscoTenantBackend(ModelBackend):
+class KioscoTenantBackend(_TenantModelBackend):
+    @staticmethod
+    def _dispositivo_habilitado(request, dispositivo):
+        if not dispositivo:
+            return False
+        if not dispositivo.is_active:
+            if request is not None:
+                request._dispositivo_revocado = True
+            return False
+        return True
+
     def authenticate(self, request, rut=None, pin=None, naviera_id=None, dispositivo_token=None, **kwargs):
         naviera_id = getattr(getattr(request, "naviera", None), "id", None)
 
@@ -35,16 +174,13 @@ class KioscoTenantBackend(ModelBackend):
         dispositivo_autenticado = FleetQueryService.buscar_dispositivo_por_token(
             naviera_id, dispositivo_token
         )
-        if not dispositivo_autenticado:
-            return None
-        if not dispositivo_autenticado.is_active:
-            if request is not None:
-                request._dispositivo_revocado = True
+        if not self._dispositivo_habilitado(request, dispositivo_autenticado):
             return None
 
         try:
-            usuario = Usuario.objects.get(rut=rut, naviera_id=naviera_id)
-            if not usuario.check_pin(pin) or not self.user_can_authenticate(usuario):
+            usuario = Usuario.objects.only(*CAMPOS_LOGIN_KIOSCO).get(rut=rut, naviera_id=naviera_id)
+            pin_ok = _credencial_verificada(usuario, "pin", pin, usuario.pin_kiosco, usuario.check_pin)
+            if not pin_ok or not self.user_can_authenticate(usuario):
                 return None
             if not Tripulacion.objects.filter(usuario=usuario, nave_id=dispositivo_autenticado.nave_id).exists():
                 return None
@@ -52,3 +188,29 @@ class KioscoTenantBackend(ModelBackend):
             return usuario
         except (Usuario.DoesNotExist, Usuario.MultipleObjectsReturned):
             return None
+
+    async def aauthenticate(self, request, rut=None, pin=None, naviera_id=None, dispositivo_token=None, **kwargs):
+        naviera_id = getattr(getattr(request, "naviera", None), "id", None)
+
+        if not rut or not pin or not naviera_id or not dispositivo_token:
+            return None
+
+        dispositivo_autenticado = await sync_to_async(FleetQueryService.buscar_dispositivo_por_token)(
+            naviera_id, dispositivo_token
+        )
+        if not self._dispositivo_habilitado(request, dispositivo_autenticado):
+            return None
+
+        try:
+            usuario = await Usuario.objects.only(*CAMPOS_LOGIN_KIOSCO).aget(rut=rut, naviera_id=naviera_id)
+        except (Usuario.DoesNotExist, Usuario.MultipleObjectsReturned):
+            return None
+        pin_ok = await _credencial_verificada_async(
+            usuario, "pin", pin, usuario.pin_kiosco, "argon2_pin", _rehashear_pin
+        )
+        if not pin_ok or not self.user_can_authenticate(usuario):
+            return None
+        if not await Tripulacion.objects.filter(usuario=usuario, nave_id=dispositivo_autenticado.nave_id).aexists():
+            return None
+        usuario._dispositivo_autenticado = dispositivo_autenticado
+        return usuario
@@ -13,8 +13,10 @@ def tenant_member_required(view_func):
             login_url = resolve_url(f"/{slug}/login/") if slug else resolve_url("/admin/login/")
             return redirect_to_login(request.get_full_path(), login_url=login_url)
 
+        # Por id: comparar request.user.naviera cargaría la Naviera del usuario
+        # en cada request solo para compararla.
         if not getattr(request.user, "es_admin_sitrep_global", False) and \
-                getattr(request.user, "naviera", None) != getattr(request, "naviera", None):
+                getattr(request.user, "naviera_id", None) != getattr(getattr(request, "naviera", None), "id", None):
             slug = kwargs.get("slug")
             login_url = resolve_url(f"/{slug}/login/") if slug else resolve_url("/")
             return redirect_to_login(request.get_full_path(), login_url=login_url)
@@ -0,0 +1,22 @@
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class Argon2WebHasher(Argon2PasswordHasher):
+    """Argon2id para passwords de tierra: 64 MiB, t=2, p=2. Mismo algorithm
+    que el hasher de Django, así los hashes argon2 existentes siguen
+    verificando y se re-hashean solos si cambian los parámetros."""
+
+    time_cost = 2
+    memory_cost = 65536
+    parallelism = 2
+
+
+class Argon2PinHasher(Argon2PasswordHasher):
+    """Argon2id liviano para el PIN de kiosco (10 MiB, t=2, p=1): el tablet
+    es sensible a latencia y el PIN ya está protegido por el rate limit del
+    login y por exigir un dispositivo autorizado."""
+
+    algorithm = "argon2_pin"
+    time_cost = 2
+    memory_cost = 10240
+    parallelism = 1
@@ -35,7 +35,10 @@ class Usuario(AbstractUser):
     pin_kiosco = models.CharField(max_length=128, null=True, blank=True)
 
     class Meta:
-        unique_together = ('naviera', 'rut')
+        unique_together = ('naviera', 'rut')  # también sirve de índice para el login de kiosco
+        indexes = [
+            models.Index(fields=['email']),  # login de tierra (WebTenantBackend)
+        ]
 
     def save(self, *args, **kwargs):
         if not self.username:
@@ -44,16 +47,25 @@ class Usuario(AbstractUser):
         super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
+        # Soft delete con un UPDATE angosto: un save() completo reescribiría
+        # todas las columnas y dispararía post_save sin necesidad.
+        type(self).objects.filter(pk=self.pk).update(is_active=False)
         self.is_active = False
-        self.save()
 
     def set_pin(self, raw_pin):
-        self.pin_kiosco = make_password(raw_pin)
+        self.pin_kiosco = make_password(raw_pin, hasher="argon2_pin")
 
     def check_pin(self, raw_pin):
         if not self.pin_kiosco:
             return False
-        return check_password(raw_pin, self.pin_kiosco)
+
+        def setter(raw_pin):
+            # PIN hasheado con otro hasher (ej. PBKDF2 previo): se re-hashea
+            # con argon2_pin al primer acierto, como hace check_password.
+            self.set_pin(raw_pin)
+            self.save(update_fields=["pin_kiosco"])
+
+        return check_password(raw_pin, self.pin_kiosco, setter, preferred="argon2_pin")
 
     @property
     def es_admin_sitrep_global(self):
@@ -1,15 +1,22 @@
+import threading
 from io import StringIO
 from unittest.mock import patch
 
+from django.contrib import admin
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth.tokens import default_token_generator
 from django.core import mail
 from django.core.cache import cache
 from django.core.management import call_command
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
+from sitrep.accounts.admin import CustomUserAdmin
+from sitrep.accounts.backends import KioscoTenantBackend, WebTenantBackend
+from sitrep.accounts.decorators import tenant_member_required
 from sitrep.accounts.models import AuditEvent, Naviera, Usuario
 from sitrep.accounts.views import (
     _normalizar_rut,
@@ -259,6 +266,13 @@ class TestDesactivarUsuario(TestCase):
         self.usuario_b.refresh_from_db()
         self.assertTrue(self.usuario_b.is_active)
 
+    def test_delete_desactiva_con_un_solo_update(self):
+        with self.assertNumQueries(1):
+            self.marinero.delete()
+        self.assertFalse(self.marinero.is_active)
+        self.marinero.refresh_from_db()
+        self.assertFalse(self.marinero.is_active)
+
 
 class TestCambiarPin(TestCase):
     def setUp(self):
@@ -334,6 +348,27 @@ class TestCambiarPin(TestCase):
         self.assertEqual(response.status_code, 403)
 
 
+class TestPinHasher(TestCase):
+    def setUp(self):
+        self.naviera = Naviera.objects.create(nombre="Naviera Hash", rut="24242424-2", slug="naviera-hash")
+        self.marinero = Usuario.objects.create_user(
+            username="marinero_hash", naviera=self.naviera, rut="25252525-2", rol="mar",
+        )
+
+    def test_set_pin_usa_argon2_pin(self):
+        self.marinero.set_pin("1234")
+        self.assertTrue(self.marinero.pin_kiosco.startswith("argon2_pin$"))
+        self.assertTrue(self.marinero.check_pin("1234"))
+        self.assertFalse(self.marinero.check_pin("4321"))
+
+    def test_pin_legacy_pbkdf2_se_rehashea_al_verificar(self):
+        self.marinero.pin_kiosco = make_password("1234", hasher="pbkdf2_sha256")
+        self.marinero.save()
+        self.assertTrue(self.marinero.check_pin("1234"))
+        self.marinero.refresh_from_db()
+        self.assertTrue(self.marinero.pin_kiosco.startswith("argon2_pin$"))
+
+
 # ---------------------------------------------------------------------------
 # Softlock login mar/tierra (rol insuficiente no debe atrapar al usuario)
 # ---------------------------------------------------------------------------
@@ -472,6 +507,59 @@ class TestTenantMemberRequired(TestCase):
         resp_otra = self.client.get(reverse("inventory:tenant_home", kwargs={"slug": self.otra_naviera.slug}))
         self.assertEqual(resp_otra.status_code, 200)
 
+    def test_chequeo_de_tenant_no_carga_la_naviera_del_usuario(self):
+        request = RequestFactory().get("/")
+        request.naviera = self.naviera
+        request.user = Usuario.objects.get(pk=self.admin_naviera.pk)
+        vista = tenant_member_required(lambda request, **kwargs: "ok")
+        with self.assertNumQueries(0):
+            self.assertEqual(vista(request, slug=self.naviera.slug), "ok")
+
+    def test_get_user_del_backend_trae_la_naviera_unida(self):
+        usuario = WebTenantBackend().get_user(self.admin_naviera.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(usuario.naviera.slug, self.naviera.slug)
+
+
+class TestCustomUserAdminSearch(TestCase):
+    def setUp(self):
+        self.naviera = Naviera.objects.create(nombre="Austral Cargo", rut="24242424-1", slug="austral")
+        self.otra = Naviera.objects.create(nombre="Pacifico Sur", rut="25252525-1", slug="pacifico")
+        self.austral = Usuario.objects.create_user(
+            username="juan-austral", naviera=self.naviera, rut="26262626-1", rol="tierra",
+        )
+        self.pacifico = Usuario.objects.create_user(
+            username="juan-pacifico", naviera=self.otra, rut="27272727-1", rol="tierra",
+        )
+        self.model_admin = CustomUserAdmin(Usuario, admin.site)
+
+    def _buscar(self, termino):
+        qs, tiene_duplicados = self.model_admin.get_search_results(None, Usuario.objects.all(), termino)
+        self.assertFalse(tiene_duplicados)
+        return set(qs)
+
+    def test_busca_por_nombre_de_naviera(self):
+        self.assertEqual(self._buscar("austral"), {self.austral})
+
+    def test_cada_termino_debe_coincidir_en_algun_campo(self):
+        self.assertEqual(self._buscar("juan pacifico"), {self.pacifico})
+        self.assertEqual(self._buscar('"Pacifico Sur" austral'), set())
+
+    def test_sin_termino_no_filtra(self):
+        self.assertEqual(self._buscar(""), {self.austral, self.pacifico})
+
+    def test_respeta_prefijos_de_search_fields(self):
+        with patch.object(CustomUserAdmin, "search_fields", ("=rut", "^username")):
+            self.assertEqual(self._buscar("26262626-1"), {self.austral})
+            self.assertEqual(self._buscar("26262626"), set())
+            self.assertEqual(self._buscar("juan"), {self.austral, self.pacifico})
+            self.assertEqual(self._buscar("austral"), set())
+
+    def test_usa_get_search_fields_del_request(self):
+        with patch.object(CustomUserAdmin, "get_search_fields", return_value=("username",)):
+            self.assertEqual(self._buscar("Pacifico Sur"), set())
+            self.assertEqual(self._buscar("juan-pacifico"), {self.pacifico})
+
 
 class TestWebTenantBackendLogin(TestCase):
     """El login de tierra (email+password) pasa por WebTenantBackend, que
@@ -506,6 +594,197 @@ class TestWebTenantBackendLogin(TestCase):
         self.assertEqual(resp.wsgi_request.user, self.admin_sitrep_global)
 
 
+class TestCacheCredencialVerificada(TestCase):
+    """Un acierto de password/PIN se memoriza un rato para no pagar el hasher
+    en cada re-login; un fallo nunca, y cambiar la credencial invalida el memo."""
+
+    def setUp(self):
+        cache.clear()
+        self.naviera = Naviera.objects.create(nombre="Naviera Cache", rut="19191919-1", slug="tenant-cache")
+        self.usuario = Usuario.objects.create_user(
+            username="usuario-cache", naviera=self.naviera, rut="20202020-1",
+            rol="tierra", email="uc@test.com", password="clave-segura-1",
+        )
+        self.request = RequestFactory().post("/")
+        self.request.naviera = self.naviera
+
+    def _auth(self, password):
+        return WebTenantBackend().authenticate(self.request, email="uc@test.com", password=password)
+
+    def test_segundo_login_no_vuelve_a_correr_el_hasher(self):
+        with patch.object(
+            Usuario, "check_password", autospec=True, side_effect=Usuario.check_password
+        ) as check:
+            self.assertEqual(self._auth("clave-segura-1"), self.usuario)
+            self.assertEqual(self._auth("clave-segura-1"), self.usuario)
+        self.assertEqual(check.call_count, 1)
+
+    def test_fallo_no_se_cachea(self):
+        with patch.object(
+            Usuario, "check_password", autospec=True, side_effect=Usuario.check_password
+        ) as check:
+            self.assertIsNone(self._auth("incorrecta"))
+            self.assertIsNone(self._auth("incorrecta"))
+        self.assertEqual(check.call_count, 2)
+
+    def test_cambio_de_password_invalida_el_acierto_cacheado(self):
+        self.assertEqual(self._auth("clave-segura-1"), self.usuario)
+        self.usuario.set_password("clave-nueva-2")
+        self.usuario.save()
+        self.assertIsNone(self._auth("clave-segura-1"))
+        self.assertEqual(self._auth("clave-nueva-2"), self.usuario)
+
+
+class TestLoginFilaAngosta(TestCase):
+    """authenticate trae una fila angosta (.only de CAMPOS_LOGIN_*); lo que lee
+    login() después (hash de sesión, update_last_login) no debe pedir más."""
+
+    def setUp(self):
+        cache.clear()
+        self.naviera = Naviera.objects.create(nombre="Naviera Angosta", rut="28282828-1", slug="tenant-angosta")
+        self.nave = Nave.objects.create(
+            naviera=self.naviera, nombre="NF", matricula="NF-1",
+            eslora=10, arqueo_bruto=100, capacidad_personas=5,
+        )
+        self.dispositivo = Dispositivo.objects.create(naviera=self.naviera, nave=self.nave, nombre="K")
+        self.token = self.dispositivo.generar_nuevo_token()
+        self.dispositivo.save()
+        Usuario.objects.create_user(
+            username="tierra-angosta", naviera=self.naviera, rut="29292929-1",
+            rol="tierra", email="tf@test.com", password="clave-segura-1",
+        )
+        crew = Usuario.objects.create_user(
+            username="crew-angosta", naviera=self.naviera, rut="30303030-1", rol="mar",
+            email="cf@test.com",
+        )
+        crew.set_pin("1234")
+        crew.save()
+        Tripulacion.objects.create(usuario=crew, nave=self.nave)
+        self.request = RequestFactory().post("/")
+        self.request.naviera = self.naviera
+
+    def _assert_login_sin_columnas_diferidas(self, usuario):
+        self.assertIn("email", usuario.get_deferred_fields())
+        with self.assertNumQueries(1):
+            usuario.get_session_auth_hash()
+            update_last_login(None, usuario)
+
+    def test_login_web(self):
+        usuario = WebTenantBackend().authenticate(self.request, email="tf@test.com", password="clave-segura-1")
+        self._assert_login_sin_columnas_diferidas(usuario)
+
+    def test_login_kiosco(self):
+        usuario = KioscoTenantBackend().authenticate(
+            self.request, rut="30303030-1", pin="1234", dispositivo_token=self.token
+        )
+        self.assertEqual(usuario.rut, "30303030-1")
+        self._assert_login_sin_columnas_diferidas(usuario)
+
+
+class TestAauthenticate(TestCase):
+    """aauthenticate aplica las mismas reglas que authenticate, con el hasher
+    corriendo fuera del event loop (CHECK_PASSWORD_EXECUTOR)."""
+
+    def setUp(self):
+        cache.clear()
+        self.naviera = Naviera.objects.create(nombre="Naviera Async", rut="21212121-1", slug="tenant-async")
+        self.nave = Nave.objects.create(
+            naviera=self.naviera, nombre="NA", matricula="NA-1",
+            eslora=10, arqueo_bruto=100, capacidad_personas=5,
+        )
+        self.dispositivo = Dispositivo.objects.create(naviera=self.naviera, nave=self.nave, nombre="K")
+        self.token = self.dispositivo.generar_nuevo_token()
+        self.dispositivo.save()
+        self.tierra = Usuario.objects.create_user(
+            username="tierra-async", naviera=self.naviera, rut="22222222-1",
+            rol="tierra", email="ta@test.com", password="clave-segura-1",
+        )
+        self.crew = Usuario.objects.create_user(
+            username="crew-async", naviera=self.naviera, rut="23232323-1", rol="mar",
+        )
+        self.crew.set_pin("1234")
+        self.crew.save()
+        Tripulacion.objects.create(usuario=self.crew, nave=self.nave)
+        self.request = RequestFactory().post("/")
+        self.request.naviera = self.naviera
+
+    async def test_web_password_correcta(self):
+        usuario = await WebTenantBackend().aauthenticate(
+            self.request, email="ta@test.com", password="clave-segura-1"
+        )
+        self.assertEqual(usuario, self.tierra)
+
+    async def test_web_password_incorrecta(self):
+        self.assertIsNone(
+            await WebTenantBackend().aauthenticate(self.request, email="ta@test.com", password="mala")
+        )
+
+    async def test_kiosco_pin_correcto_desde_dispositivo_de_su_nave(self):
+        usuario = await KioscoTenantBackend().aauthenticate(
+            self.request, rut="23232323-1", pin="1234", dispositivo_token=self.token
+        )
+        self.assertEqual(usuario, self.crew)
+        self.assertEqual(usuario._dispositivo_autenticado, self.dispositivo)
+
+    async def test_kiosco_tripulante_sin_pin_no_entra(self):
+        await Usuario.objects.filter(pk=self.crew.pk).aupdate(pin_kiosco=None)
+        self.assertIsNone(
+            await KioscoTenantBackend().aauthenticate(
+                self.request, rut="23232323-1", pin="1234", dispositivo_token=self.token
+            )
+        )
+
+    async def test_kiosco_dispositivo_revocado_marca_request(self):
+        await Dispositivo.objects.filter(pk=self.dispositivo.pk).aupdate(is_active=False)
+        usuario = await KioscoTenantBackend().aauthenticate(
+            self.request, rut="23232323-1", pin="1234", dispositivo_token=self.token
+        )
+        self.assertIsNone(usuario)
+        self.assertTrue(self.request._dispositivo_revocado)
+
+    async def _autenticar_registrando_threads_de_save(self, autenticar):
+        threads = []
+        save_original = Usuario.save
+
+        def save(usuario, *args, **kwargs):
+            threads.append((threading.current_thread().name, kwargs.get("update_fields")))
+            return save_original(usuario, *args, **kwargs)
+
+        with patch.object(Usuario, "save", autospec=True, side_effect=save):
+            usuario = await autenticar()
+        for thread, _ in threads:
+            self.assertFalse(thread.startswith("check-password"), thread)
+        return usuario, threads
+
+    async def test_rehash_de_password_no_se_guarda_en_el_pool_del_hasher(self):
+        """El pool solo verifica; el save del hash actualizado (PBKDF2 ->
+        Argon2) va por el thread de siempre, no por CHECK_PASSWORD_EXECUTOR."""
+        await Usuario.objects.filter(pk=self.tierra.pk).aupdate(
+            password=make_password("clave-segura-1", hasher="pbkdf2_sha256")
+        )
+        usuario, threads = await self._autenticar_registrando_threads_de_save(
+            lambda: WebTenantBackend().aauthenticate(self.request, email="ta@test.com", password="clave-segura-1")
+        )
+        self.assertEqual(usuario, self.tierra)
+        self.assertEqual([campos for _, campos in threads], [["password"]])
+        await self.tierra.arefresh_from_db()
+        self.assertTrue(self.tierra.password.startswith("argon2"))
+
+    async def test_rehash_de_pin_no_se_guarda_en_el_pool_del_hasher(self):
+        await Usuario.objects.filter(pk=self.crew.pk).aupdate(
+            pin_kiosco=make_password("1234", hasher="pbkdf2_sha256")
+        )
+        usuario, threads = await self._autenticar_registrando_threads_de_save(
+            lambda: KioscoTenantBackend().aauthenticate(
+                self.request, rut="23232323-1", pin="1234", dispositivo_token=self.token
+            )
+        )
+        self.assertEqual(usuario, self.crew)
+        self.assertEqual([campos for _, campos in threads], [["pin_kiosco"]])
+        await self.crew.arefresh_from_db()
+        self.assertTrue(self.crew.pin_kiosco.startswith("argon2_pin"))
+
+
 # ---------------------------------------------------------------------------
 # Recuperación de contraseña (tierra)
 # ---------------------------------------------------------------------------
@@ -72,8 +72,8 @@ def login_unificado(request, slug, modo_default="tierra"):
 
     if request.method == "POST":
         # Scope por modo (ej. login_mar, login_tierra): cada modo mantiene su propio
-        # budget, mar en particular porque cada intento corre check_password por cada
-        # dispositivo de la naviera (KioscoTenantBackend) y es amplificador de DoS.
+        # budget, mar en particular porque cada intento corre check_password (PIN y,
+        # para dispositivos legacy sin token_lookup, token) y es amplificador de DoS.
         # Un solo chequeo acá cubre cualquier modo nuevo que se agregue sin repetirlo.
         if hit_rate_limit(f"login_{modo}", request, limit=10, window_seconds=60):
             return _render_login_unificado(
@@ -25,6 +25,10 @@ class RecursoAdmin(admin.ModelAdmin):
         "naviera", "nave", "catalogo_version", "activo",
         "created_at", "tiene_regla", "num_requerimientos",
     )
+    list_select_related = (
+        "area", "periodicidad", "naviera", "nave",
+        "catalogo_version__naviera", "catalogo_version__nave",
+    )
     list_filter = ("categoria", "tipo", "periodicidad", "area", "activo", "naviera")
     search_fields = ("codigo", "nombre")
     readonly_fields = (
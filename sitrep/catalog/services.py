@@ -1,6 +1,11 @@
+import bisect
+import json
 import operator
+from collections import defaultdict
+from functools import lru_cache
 
 from django.db import transaction
+from django.db.models import Q
 
 from .models import Area, CatalogoVersion, Periodicidad, Recurso
 
@@ -27,45 +32,135 @@ class CatalogRuleEngine:
         """
         if not regla_json:
             return 0, True
+        return cls.compilar_regla(regla_json)(nave)
+
+    @classmethod
+    def compilar_regla(cls, regla_json):
+        """Regla JSON -> función nave -> (cantidad, es_visible). Cacheada por el
+        contenido de la regla (JSON canónico), no por Recurso: editar la regla
+        produce otra clave, así que no hay nada que invalidar."""
+        try:
+            clave = json.dumps(regla_json, sort_keys=True)
+        except (TypeError, ValueError):
+            return cls._compilar(regla_json)
+        return _regla_compilada(clave)
+
+    @classmethod
+    def _compilar(cls, regla_json):
+        if not regla_json:
+            return lambda nave: (0, True)
 
         version = regla_json.get('version', 1)
-        evaluador = _EVALUADORES_DE_REGLA.get(version)
-        if evaluador is None:
+        compilador = _COMPILADORES_DE_REGLA.get(version)
+        if compilador is None:
             # versión que este motor no reconoce (ej. escrita por una
             # versión futura de la app) — no se arriesga a interpretar un schema
             # que no entiende, cae al mismo fallback seguro que "sin regla".
-            return 0, True
-        return evaluador(nave, regla_json)
+            return lambda nave: (0, True)
+        return compilador(regla_json)
 
     @classmethod
-    def _evaluar_v1(cls, nave, regla_json) -> tuple:
+    def _compilar_v1(cls, regla_json):
         atributo = regla_json.get('atributo')
-        valor_nave = getattr(nave, atributo, None)
+        fallback = (regla_json.get('fallback_cantidad', 0), regla_json.get('fallback_visible', False))
+        # Operador desconocido nunca matchea: la condición se descarta acá.
+        condiciones = [
+            (
+                cls.OPERADORES[condicion.get('operador')],
+                type(condicion.get('valor')),
+                condicion.get('valor'),
+                (condicion.get('resultado_cantidad', 0), condicion.get('resultado_visible', False)),
+            )
+            for condicion in regla_json.get('condiciones', [])
+            if condicion.get('operador') in cls.OPERADORES
+        ]
 
-        if valor_nave is None:
-            return (regla_json.get('fallback_cantidad', 0), regla_json.get('fallback_visible', False))
+        tipo_escalera, buscar, umbrales, resultados_escalera, condiciones = cls._separar_escalera(condiciones)
+
+        def evaluar(nave):
+            valor_nave = getattr(nave, atributo, None)
+            if valor_nave is None:
+                return fallback
+
+            if umbrales:
+                try:
+                    valor_nave_casteado = tipo_escalera(valor_nave)
+                except (ValueError, TypeError):
+                    pass
+                else:
+                    # NaN no cumple ninguna comparación; bisect lo ubicaría en 0.
+                    if valor_nave_casteado == valor_nave_casteado:
+                        indice = buscar(umbrales, valor_nave_casteado)
+                        if indice < len(umbrales):
+                            return resultados_escalera[indice]
+
+            for func_op, tipo_regla, valor_regla, resultado in condiciones:
+                try:
+                    valor_nave_casteado = tipo_regla(valor_nave)
+                except (ValueError, TypeError):
+                    continue
+                if func_op(valor_nave_casteado, valor_regla):
+                    return resultado
+
+            return fallback
+
+        return evaluar
+
+    @staticmethod
+    def _separar_escalera(condiciones):
+        """Parte las condiciones en (escalera, resto). La escalera es el prefijo
+        de condiciones numéricas con el mismo operador ('<=' o '<') y el mismo
+        tipo de valor — el caso típico "<=10, <=50, ..." — y se resuelve con un
+        bisect sobre los umbrales en vez de probar una por una. El resto se
+        sigue evaluando en orden si la escalera no matchea.
+
+        Primera-que-cumple se conserva: un umbral que no supera a uno anterior
+        nunca puede ganar y se descarta, así los umbrales quedan estrictamente
+        crecientes y el primer umbral que cumple es el que encuentra bisect.
+        Retorna (tipo, bisect, umbrales, resultados, resto); umbrales vacío si
+        no hay escalera que valga la pena."""
+        sin_escalera = (None, None, [], [], condiciones)
+        if not condiciones:
+            return sin_escalera
+        func_op, tipo = condiciones[0][0], condiciones[0][1]
+        buscar = _BISECT_POR_OPERADOR.get(func_op)
+        # type() exacto: bool es subclase de int pero no es un umbral.
+        if buscar is None or tipo not in (int, float):
+            return sin_escalera
+
+        largo = 0
+        while largo < len(condiciones) and condiciones[largo][:2] == (func_op, tipo):
+            largo += 1
+        if largo < 2:
+            return sin_escalera
+
+        umbrales, resultados = [], []
+        for _, _, valor, resultado in condiciones[:largo]:
+            if valor != valor or (umbrales and valor <= umbrales[-1]):
+                continue
+            umbrales.append(valor)
+            resultados.append(resultado)
+        return tipo, buscar, umbrales, resultados, condiciones[largo:]
 
-        for condicion in regla_json.get('condiciones', []):
-            func_op = cls.OPERADORES.get(condicion.get('operador'))
-            valor_regla = condicion.get('valor')
 
-            try:
-                valor_nave_casteado = type(valor_regla)(valor_nave)
-            except (ValueError, TypeError):
-                continue
+# x <= umbral[i] para el primer i: bisect_left; x < umbral[i]: bisect_right.
+_BISECT_POR_OPERADOR = {
+    operator.le: bisect.bisect_left,
+    operator.lt: bisect.bisect_right,
+}
 
-            if func_op and func_op(valor_nave_casteado, valor_regla):
-                return (condicion.get('resultado_cantidad', 0), condicion.get('resultado_visible', False))
 
-        return (regla_json.get('fallback_cantidad', 0), regla_json.get('fallback_visible', False))
+@lru_cache(maxsize=4096)
+def _regla_compilada(clave):
+    return CatalogRuleEngine._compilar(json.loads(clave))
 
 
 # Dispatch por versión de regla_aplicacion. Filas sin "version" se tratan como
 # v1 (regla_json.get('version', 1) arriba). Una v2 nueva = un método
-# _evaluar_v2 + una entrada acá, sin tocar ni arriesgar romper las filas v1
+# _compilar_v2 + una entrada acá, sin tocar ni arriesgar romper las filas v1
 # existentes.
-_EVALUADORES_DE_REGLA = {
-    1: CatalogRuleEngine._evaluar_v1,
+_COMPILADORES_DE_REGLA = {
+    1: CatalogRuleEngine._compilar_v1,
 }
 
 
@@ -97,10 +192,51 @@ class CatalogoResolver:
     capas nave > naviera > central (o solo nave+naviera si catalogo_independiente
     aplica). No modifica nada — función de lectura pura sobre el estado guardado."""
 
+    # Filas de Recurso por round-trip al recorrer el catálogo (cursor de
+    # servidor en Postgres): la memoria no crece con el historial de versiones.
+    CHUNK_SIZE = 2000
+
     @classmethod
     def _independiente(cls, nave):
         return bool(nave.catalogo_independiente or nave.naviera.catalogo_independiente)
 
+    @staticmethod
+    def _ordenar_por_version(queryset, campos=None):
+        """campos: columnas a traer (.only) cuando el llamador no usa la fila
+        completa ni sus relaciones — ej. el motor de reglas, que no necesita
+        requerimientos ni descripcion."""
+        if campos is not None:
+            queryset = queryset.only(*campos)
+        else:
+            queryset = queryset.select_related('linaje_raiz', 'catalogo_version')
+        return queryset.order_by('-catalogo_version__numero', '-id')
+
+    @staticmethod
+    def _registrar_cabeza(vistos, fila):
+        """La primera fila que aparece de cada lineage es su cabeza (None si
+        está inactiva); las siguientes son versiones viejas y se descartan."""
+        raiz_id = fila.linaje_raiz_id or fila.id
+        if raiz_id not in vistos:
+            vistos[raiz_id] = fila if fila.activo else None
+
+    @classmethod
+    def _cabezas_por_lineage(cls, filas):
+        """filas ya ordenadas por versión descendente, de UN solo scope."""
+        vistos = {}
+        for fila in filas:
+            cls._registrar_cabeza(vistos, fila)
+        return vistos
+
+    @classmethod
+    def _cabezas_por_scope(cls, queryset, scope_de):
+        """_cabezas_por_lineage para filas de varios scopes a la vez
+        (scope_de(fila) -> clave), en streaming: con .iterator() solo quedan en
+        memoria las cabezas, no cada versión vieja de cada lineage."""
+        cabezas = defaultdict(dict)
+        for fila in queryset.iterator(chunk_size=cls.CHUNK_SIZE):
+            cls._registrar_cabeza(cabezas[scope_de(fila)], fila)
+        return cabezas
+
     @classmethod
     def filas_vigentes_por_lineage(cls, queryset, numero_maximo=None):
         """De un queryset de Recurso (ya filtrado a UN scope), retorna
@@ -110,39 +246,81 @@ class CatalogoResolver:
         None = usar la cabeza viva."""
         if numero_maximo is not None:
             queryset = queryset.filter(catalogo_version__numero__lte=numero_maximo)
-        filas = queryset.select_related('linaje_raiz', 'catalogo_version').order_by(
-            '-catalogo_version__numero', '-id'
-        )
-        vistos = {}
-        for fila in filas:
-            raiz_id = fila.linaje_raiz_id or fila.id
-            if raiz_id not in vistos:
-                vistos[raiz_id] = fila if fila.activo else None
-        return vistos
+        return cls._cabezas_por_lineage(cls._ordenar_por_version(queryset).iterator(chunk_size=cls.CHUNK_SIZE))
 
     @classmethod
-    def catalogo_efectivo(cls, nave, *, pin_central=None, pin_naviera=None, pin_nave=None):
+    def catalogo_efectivo(cls, nave, *, pin_central=None, pin_naviera=None, pin_nave=None, campos=None):
         """Lista de Recurso activos y efectivos para `nave`. pin_* = numero tope
-        de CatalogoVersion para esa capa (None = capa viva)."""
+        de CatalogoVersion para esa capa (None = capa viva). campos: ver
+        _ordenar_por_version.
+
+        Una sola query con el OR de los scopes (cada uno con su pin) en vez de
+        una por capa; el reparto por capa y la precedencia se hacen en memoria."""
         naviera = nave.naviera
         independiente = cls._independiente(nave)
 
         capas_ordenadas = [
-            (Recurso.objects.filter(naviera=naviera, nave=nave), pin_nave),
-            (Recurso.objects.filter(naviera=naviera, nave__isnull=True), pin_naviera),
+            ('nave', Q(naviera=naviera, nave=nave), pin_nave),
+            ('naviera', Q(naviera=naviera, nave__isnull=True), pin_naviera),
         ]
         if not independiente:
             capas_ordenadas.append(
-                (Recurso.objects.filter(naviera__isnull=True, nave__isnull=True), pin_central)
+                ('central', Q(naviera__isnull=True, nave__isnull=True), pin_central)
             )
 
-        resultado = {}
-        for queryset, pin in capas_ordenadas:
-            for raiz_id, fila in cls.filas_vigentes_por_lineage(queryset, pin).items():
-                if raiz_id in resultado:
-                    continue
-                resultado[raiz_id] = fila
+        filtro = Q()
+        for _, scope, pin in capas_ordenadas:
+            if pin is not None:
+                scope &= Q(catalogo_version__numero__lte=pin)
+            filtro |= scope
+
+        cabezas_por_capa = cls._cabezas_por_scope(
+            cls._ordenar_por_version(Recurso.objects.filter(filtro), campos),
+            lambda fila: 'nave' if fila.nave_id else ('naviera' if fila.naviera_id else 'central'),
+        )
+        return cls._componer_capas(cabezas_por_capa[capa] for capa, _, _ in capas_ordenadas)
 
+    @classmethod
+    def catalogos_efectivos(cls, naves, campos=None):
+        """{nave.id: catalogo_efectivo(nave)} para varias naves (capas vivas, sin
+        pins) con una sola query. Las cabezas de la capa central y de cada
+        naviera se calculan una vez y se comparten entre sus naves. Las naves
+        deben venir con select_related('naviera'). campos: ver
+        _ordenar_por_version."""
+        naves = list(naves)
+        if not naves:
+            return {}
+
+        filtro = Q(nave__in=naves) | Q(naviera_id__in={nave.naviera_id for nave in naves}, nave__isnull=True)
+        if not all(cls._independiente(nave) for nave in naves):
+            filtro |= Q(naviera__isnull=True, nave__isnull=True)
+
+        cabezas = cls._cabezas_por_scope(
+            cls._ordenar_por_version(Recurso.objects.filter(filtro), campos),
+            lambda fila: (
+                ('nave', fila.nave_id) if fila.nave_id
+                else ('naviera', fila.naviera_id) if fila.naviera_id
+                else ('central', None)
+            ),
+        )
+        resultado = {}
+        for nave in naves:
+            capas = [cabezas[('nave', nave.id)], cabezas[('naviera', nave.naviera_id)]]
+            if not cls._independiente(nave):
+                capas.append(cabezas[('central', None)])
+            resultado[nave.id] = cls._componer_capas(capas)
+        return resultado
+
+    @staticmethod
+    def _componer_capas(cabezas_por_capa):
+        """cabezas_por_capa en orden de precedencia (nave, naviera, central): la
+        primera capa que trae una lineage la define, aunque sea con None
+        (lineage removida en esa capa)."""
+        resultado = {}
+        for cabezas in cabezas_por_capa:
+            for raiz_id, fila in cabezas.items():
+                if raiz_id not in resultado:
+                    resultado[raiz_id] = fila
         return [fila for fila in resultado.values() if fila is not None]
 
     @classmethod
@@ -1,7 +1,9 @@
 import json
 from unittest import skipUnless
+from unittest.mock import patch
 
 from django.db import IntegrityError, connection, transaction as db_transaction
+from django.db.models import QuerySet
 from django.test import TestCase
 from django.urls import reverse
 
@@ -182,6 +184,63 @@ class TestCatalogRuleEngine(TestCase):
             (0, True),
         )
 
+    def test_compilar_regla_reutiliza_la_compilacion_por_contenido(self):
+        """Misma regla (aunque sea otro dict, con otro orden de claves) = mismo
+        evaluador compilado; cambiar el contenido compila uno nuevo."""
+        reordenada = dict(reversed(list(self.regla_semanal.items())))
+        self.assertIs(
+            CatalogRuleEngine.compilar_regla(self.regla_semanal),
+            CatalogRuleEngine.compilar_regla(reordenada),
+        )
+        editada = {**self.regla_semanal, "fallback_cantidad": 7}
+        self.assertIsNot(
+            CatalogRuleEngine.compilar_regla(self.regla_semanal),
+            CatalogRuleEngine.compilar_regla(editada),
+        )
+
+    def test_evaluar_regla_castea_al_tipo_del_valor_de_la_regla(self):
+        """eslora 10.5 contra valor int 10: se compara int(10.5) == 10 <= 10."""
+        self.nave.eslora = 10.5
+        self.assertEqual(CatalogRuleEngine.evaluar_regla(self.nave, self.regla_semanal), (0, False))
+
+    def test_escalera_de_umbrales_respeta_primera_que_cumple(self):
+        """Las escaleras "<="/"<" se resuelven con bisect; el resultado tiene que
+        ser el mismo que probar las condiciones en orden, incluso desordenadas,
+        con umbrales tapados por uno anterior o seguidas de otro operador."""
+        def en_orden(regla, valor):
+            for c in regla["condiciones"]:
+                tipo = type(c["valor"])
+                if CatalogRuleEngine.OPERADORES[c["operador"]](tipo(valor), c["valor"]):
+                    return c["resultado_cantidad"], c["resultado_visible"]
+            return regla["fallback_cantidad"], regla["fallback_visible"]
+
+        def regla(operador, valores, extra=()):
+            condiciones = [
+                {"operador": operador, "valor": v, "resultado_cantidad": i, "resultado_visible": True}
+                for i, v in enumerate(valores)
+            ]
+            return {
+                "atributo": "eslora",
+                "condiciones": condiciones + list(extra),
+                "fallback_cantidad": -1,
+                "fallback_visible": False,
+            }
+
+        cola = [{"operador": ">", "valor": 30, "resultado_cantidad": 99, "resultado_visible": True}]
+        reglas = [
+            regla("<=", [10, 20, 30]),
+            regla("<", [10, 20, 30]),
+            regla("<=", [30, 10, 20, 30]),
+            regla("<", [12.5, 12.5, 40.0]),
+            regla("<=", [10, 20], extra=cola),
+            self.regla_semanal,
+        ]
+        for r in reglas:
+            for valor in (0, 9.9, 10, 10.5, 12.5, 19, 20, 25, 30, 30.5, 40, 41):
+                self.nave.eslora = valor
+                with self.subTest(regla=r["condiciones"], eslora=valor):
+                    self.assertEqual(CatalogRuleEngine.evaluar_regla(self.nave, r), en_orden(r, valor))
+
 
 class TestConstruirLabelRequerimiento(TestCase):
     def test_tipo_estandar_usa_el_texto_del_editor(self):
@@ -290,6 +349,17 @@ class TestCatalogoResolver(TestCase):
         efectivo = CatalogoResolver.catalogo_efectivo(self.nave)
         self.assertEqual([r.id for r in efectivo], [central.id])
 
+    def test_todas_las_capas_en_una_query(self):
+        central = self._recurso("Extintor")
+        v_naviera = CatalogoVersion.crear_para_scope(naviera=self.naviera)
+        override = self._recurso("Extintor (override)", naviera=self.naviera, version=v_naviera, linaje_raiz=central)
+        v_nave = CatalogoVersion.crear_para_scope(nave=self.nave)
+        propio = self._recurso("Bengala", naviera=self.naviera, nave=self.nave, version=v_nave)
+
+        with self.assertNumQueries(1):
+            efectivo = CatalogoResolver.catalogo_efectivo(self.nave)
+        self.assertEqual({r.id for r in efectivo}, {override.id, propio.id})
+
     def test_override_naviera_reemplaza_central_para_todas_sus_naves(self):
         central = self._recurso("Extintor")
         v_naviera = CatalogoVersion.crear_para_scope(naviera=self.naviera)
@@ -391,6 +461,24 @@ class TestCatalogoResolver(TestCase):
         self.assertEqual([r.id for r in efectivo_v1], [v1_central.id])
         self.assertEqual([r.id for r in efectivo_live], [v2_central.id])
 
+    def test_cabezas_por_scope_en_streaming_guarda_solo_cabezas(self):
+        v1_central = self._recurso("Extintor v1")
+        v2 = CatalogoVersion.crear_para_scope()
+        v2_central = self._recurso("Extintor v2", version=v2, linaje_raiz=v1_central)
+        bengala = self._recurso("Bengala")
+        v_naviera = CatalogoVersion.crear_para_scope(naviera=self.naviera)
+        override = self._recurso("Extintor (naviera)", naviera=self.naviera, version=v_naviera, linaje_raiz=v1_central)
+        self._recurso("Bengala (removida)", naviera=self.naviera, version=v_naviera, linaje_raiz=bengala, activo=False)
+
+        queryset = CatalogoResolver._ordenar_por_version(Recurso.objects.all())
+        with patch.object(QuerySet, "iterator", autospec=True, side_effect=QuerySet.iterator) as iterator:
+            cabezas = CatalogoResolver._cabezas_por_scope(
+                queryset, lambda fila: 'naviera' if fila.naviera_id else 'central',
+            )
+        iterator.assert_called_once_with(queryset, chunk_size=CatalogoResolver.CHUNK_SIZE)
+        self.assertEqual(cabezas['central'], {v1_central.id: v2_central, bengala.id: bengala})
+        self.assertEqual(cabezas['naviera'], {v1_central.id: override, bengala.id: None})
+
 
 class TestCatalogoEditorService(TestCase):
     def setUp(self):
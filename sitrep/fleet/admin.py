@@ -7,12 +7,12 @@ from sitrep.inspection.services import MotorReglasSITREP
 @admin.register(Nave)
 class NaveAdmin(admin.ModelAdmin):
     list_display = ("nombre", "matricula", "naviera", "eslora", "is_active")
+    list_select_related = ("naviera",)
     list_filter = ("naviera", "is_active")
     actions = ["sincronizar_matriz"]
 
     def sincronizar_matriz(self, request, queryset):
-        for nave in queryset:
-            MotorReglasSITREP.sincronizar_matriz_nave(nave)
+        MotorReglasSITREP.sincronizar_matrices_naves(queryset.select_related("naviera"))
         self.message_user(request, f"Matriz sincronizada para {queryset.count()} nave(s).")
 
     sincronizar_matriz.short_description = "Sincronizar MatrizNaveRecurso"
@@ -21,7 +21,10 @@ class NaveAdmin(admin.ModelAdmin):
 @admin.register(Dispositivo)
 class DispositivoAdmin(admin.ModelAdmin):
     list_display = ("nombre", "nave", "naviera", "is_active", "creado_en")
+    list_select_related = ("nave", "naviera")
     list_filter = ("naviera", "is_active", "nave")
 
 
-admin.site.register(Tripulacion)
+@admin.register(Tripulacion)
+class TripulacionAdmin(admin.ModelAdmin):
+    list_select_related = ("usuario", "nave")
@@ -12,9 +12,9 @@ class VerificarDispositivoView(APIView):
     """Dice si el token de kiosco que trae el cliente sigue vigente (dispositivo
     existe, es de esta naviera y is_active=True). Lo consume el login para no
     confiar solo en la presencia del token en localStorage. Anónimo: se llama
-    antes de autenticar. Throttle por IP porque corre el mismo loop de
-    check_password por dispositivo que el login — superficie de DoS si no se
-    limita."""
+    antes de autenticar. Throttle por IP porque comparte la búsqueda de token
+    con el login (incluido el fallback de check_password para dispositivos
+    legacy) — superficie de DoS si no se limita."""
 
     authentication_classes = []  # anónimo; además hace que DRF omita CSRF
     permission_classes = [AllowAny]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0002_nave_catalogo_independiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispositivo',
+            name='token_lookup',
+            field=models.CharField(blank=True, editable=False, help_text='HMAC-SHA256 del token físico: índice para encontrar el dispositivo en una sola query.', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0003_dispositivo_token_lookup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dispositivo',
+            index=models.Index(fields=['naviera', 'is_active'], name='fleet_dispo_naviera_87935f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nave',
+            index=models.Index(fields=['naviera', 'is_active'], name='fleet_nave_naviera_d98ec1_idx'),
+        ),
+    ]
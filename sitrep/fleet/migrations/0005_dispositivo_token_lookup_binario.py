@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+
+def hex_a_bytes(apps, schema_editor):
+    Dispositivo = apps.get_model('fleet', 'Dispositivo')
+    for dispositivo in Dispositivo.objects.filter(token_lookup__isnull=False).only('id', 'token_lookup'):
+        Dispositivo.objects.filter(pk=dispositivo.pk).update(
+            token_lookup_binario=bytes.fromhex(dispositivo.token_lookup)
+        )
+
+
+def bytes_a_hex(apps, schema_editor):
+    Dispositivo = apps.get_model('fleet', 'Dispositivo')
+    for dispositivo in Dispositivo.objects.filter(token_lookup_binario__isnull=False).only('id', 'token_lookup_binario'):
+        Dispositivo.objects.filter(pk=dispositivo.pk).update(
+            token_lookup=bytes(dispositivo.token_lookup_binario).hex()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0004_naviera_is_active_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dispositivo',
+            name='token_lookup_binario',
+            field=models.BinaryField(blank=True, editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(hex_a_bytes, bytes_a_hex),
+        migrations.RemoveField(
+            model_name='dispositivo',
+            name='token_lookup',
+        ),
+        migrations.RenameField(
+            model_name='dispositivo',
+            old_name='token_lookup_binario',
+            new_name='token_lookup',
+        ),
+        migrations.AlterField(
+            model_name='dispositivo',
+            name='token_lookup',
+            field=models.BinaryField(blank=True, editable=False, help_text='HMAC-SHA256 del token físico: índice para encontrar el dispositivo en una sola query.', max_length=32, null=True, unique=True),
+        ),
+    ]
@@ -1,9 +1,9 @@
 import secrets
 
 from django.conf import settings
-from django.contrib.auth.hashers import make_password, check_password
 from django.db import models
 from django.db.models import Q, UniqueConstraint
+from django.utils.crypto import salted_hmac
 
 from core.tenant import TenantManager
 
@@ -32,10 +32,15 @@ class Nave(models.Model):
                 name='unica_matricula_activa_por_naviera',
             )
         ]
+        indexes = [
+            models.Index(fields=['naviera', 'is_active']),
+        ]
 
     def delete(self, *args, **kwargs):
+        # Soft delete con un UPDATE angosto: sin save() completo ni post_save
+        # (que pasaría por el signal de sincronización de inspection).
+        type(self).objects.filter(pk=self.pk).update(is_active=False)
         self.is_active = False
-        self.save()
 
     def __str__(self):
         estado = "" if self.is_active else " [INACTIVA]"
@@ -47,20 +52,56 @@ class Dispositivo(models.Model):
     nave = models.ForeignKey(Nave, on_delete=models.CASCADE, related_name='dispositivos')
     nombre = models.CharField(max_length=100, help_text='Ej: Tablet Puente Mando, PC Sala Máquinas')
     token_hash = models.CharField(max_length=128, blank=True, null=True, help_text='Hash criptográfico del token físico')
+    # 32 bytes crudos (no 64 de hex): índice unique a la mitad de ancho.
+    token_lookup = models.BinaryField(
+        max_length=32, unique=True, blank=True, null=True, editable=False,
+        help_text='HMAC-SHA256 del token físico: índice para encontrar el dispositivo en una sola query.',
+    )
     is_active = models.BooleanField(default=True, help_text='Apagar si la tablet se pierde o se daña')
     creado_en = models.DateTimeField(auto_now_add=True)
 
     objects = TenantManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['naviera', 'is_active']),
+        ]
+
+    @staticmethod
+    def calcular_token_lookup(token_plano, clave=None):
+        """HMAC determinista del token, keyed con settings.DISPOSITIVO_TOKEN_KEY
+        (o `clave`): permite buscar por igualdad en vez de correr check_password
+        contra cada fila. Es la única credencial guardada del dispositivo, así
+        que perder la clave deja a todos los tablets afuera hasta re-tatuarlos;
+        al rotarla, la anterior va a DISPOSITIVO_TOKEN_KEY_FALLBACKS."""
+        return salted_hmac(
+            'sitrep.fleet.Dispositivo.token_lookup', token_plano,
+            secret=clave or settings.DISPOSITIVO_TOKEN_KEY, algorithm='sha256',
+        ).digest()
+
+    @staticmethod
+    def claves_token_anteriores():
+        claves = list(settings.DISPOSITIVO_TOKEN_KEY_FALLBACKS)
+        if settings.DISPOSITIVO_TOKEN_KEY == settings.SECRET_KEY:
+            # Sin clave propia, la del token rota junto con SECRET_KEY.
+            claves += settings.SECRET_KEY_FALLBACKS
+        return claves
+
     def generar_nuevo_token(self):
+        # 256 bits aleatorios: el HMAC basta, un hasher lento (pensado para
+        # passwords humanas) no agrega nada. token_hash queda solo para
+        # dispositivos tatuados antes de token_lookup.
         token_plano = secrets.token_urlsafe(32)
-        self.token_hash = make_password(token_plano)
+        self.token_hash = None
+        self.token_lookup = self.calcular_token_lookup(token_plano)
         return token_plano
 
-    def verificar_token(self, token_plano):
-        if not self.token_hash:
-            return False
-        return check_password(token_plano, self.token_hash)
+    @property
+    def huella_token(self):
+        """Texto para mostrar qué token quedó guardado; no sirve para autenticar."""
+        if self.token_lookup:
+            return bytes(self.token_lookup).hex()
+        return self.token_hash or ""
 
     def __str__(self):
         estado = "" if self.is_active else " [BLOQUEADO]"
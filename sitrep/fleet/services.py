@@ -1,3 +1,4 @@
+from django.contrib.auth.hashers import check_password
 from django.http import Http404
 
 from sitrep.fleet.models import Dispositivo, Nave, Tripulacion
@@ -38,14 +39,47 @@ class FleetQueryService:
     @staticmethod
     def buscar_dispositivo_por_token(naviera_id, token_plano):
         """Dispositivo (activo O revocado) cuyo token coincide, o None. El
-        llamador decide qué hacer con is_active. Un solo lugar corre el loop
-        de verificación — lo comparten el login de mar y el endpoint de
-        verificación del frontend."""
+        llamador decide qué hacer con is_active. Un solo lugar resuelve el
+        token — lo comparten el login de mar y el endpoint de verificación
+        del frontend.
+
+        Camino normal: una query indexada por token_lookup. Los dispositivos
+        tatuados antes de que existiera token_lookup caen al loop de
+        check_password (solo sobre esos), y al primer match quedan con su
+        lookup guardado para no volver a pasar por ahí. Ese loop recorre
+        tuplas (pk, hash), no instancias: un token equivocado lo recorre
+        entero, y solo el match se carga como modelo.
+
+        Tras rotar DISPOSITIVO_TOKEN_KEY, un dispositivo con lookup calculado
+        con una clave anterior (DISPOSITIVO_TOKEN_KEY_FALLBACKS) se encuentra
+        con una query más y queda re-indexado con la clave actual."""
         if not naviera_id or not token_plano:
             return None
-        for d in Dispositivo.objects.filter(naviera_id=naviera_id).order_by("-is_active"):
-            if d.verificar_token(token_plano):
-                return d
+        token_lookup = Dispositivo.calcular_token_lookup(token_plano)
+        try:
+            return Dispositivo.objects.get(naviera_id=naviera_id, token_lookup=token_lookup)
+        except Dispositivo.DoesNotExist:
+            pass
+        claves_anteriores = Dispositivo.claves_token_anteriores()
+        if claves_anteriores:
+            dispositivo = Dispositivo.objects.filter(
+                naviera_id=naviera_id,
+                token_lookup__in=[Dispositivo.calcular_token_lookup(token_plano, clave) for clave in claves_anteriores],
+            ).first()
+            if dispositivo is not None:
+                dispositivo.token_lookup = token_lookup
+                dispositivo.save(update_fields=["token_lookup"])
+                return dispositivo
+        legacy = (
+            Dispositivo.objects
+            .filter(naviera_id=naviera_id, token_lookup__isnull=True, token_hash__isnull=False)
+            .order_by("-is_active")
+            .values_list("pk", "token_hash")
+        )
+        for pk, token_hash in legacy:
+            if check_password(token_plano, token_hash):
+                Dispositivo.objects.filter(pk=pk).update(token_lookup=token_lookup, token_hash=None)
+                return Dispositivo.objects.get(pk=pk)
         return None
 
     @staticmethod
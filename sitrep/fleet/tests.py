@@ -1,3 +1,7 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
 from django.core.cache import cache
 from django.http import Http404
 from django.test import TestCase
@@ -124,6 +128,15 @@ class TestFleetQueryService(TenantFixturesMixin, TestCase):
         self.assertEqual(nave.id, self.nave_a.id)
 
 
+class TestNaveSoftDelete(TenantFixturesMixin, TestCase):
+    def test_delete_desactiva_con_un_solo_update(self):
+        with self.assertNumQueries(1):
+            self.nave_a.delete()
+        self.assertFalse(self.nave_a.is_active)
+        self.nave_a.refresh_from_db()
+        self.assertFalse(self.nave_a.is_active)
+
+
 class TestBuscarDispositivoPorToken(TenantFixturesMixin, TestCase):
     def setUp(self):
         super().setUp()
@@ -156,6 +169,80 @@ class TestBuscarDispositivoPorToken(TenantFixturesMixin, TestCase):
     def test_sin_token_retorna_none(self):
         self.assertIsNone(FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, ""))
 
+    def test_token_nuevo_se_resuelve_con_una_query(self):
+        with self.assertNumQueries(1):
+            d = FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, self.token_a)
+        self.assertEqual(d, self.dispositivo_a)
+
+    def test_dispositivo_legacy_sin_lookup_matchea_y_queda_con_lookup(self):
+        """Dispositivos tatuados antes de token_lookup siguen entrando por
+        check_password, y el primer match les guarda el lookup."""
+        Dispositivo.objects.filter(pk=self.dispositivo_a.pk).update(
+            token_lookup=None, token_hash=make_password(self.token_a)
+        )
+        d = FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, self.token_a)
+        self.assertEqual(d, self.dispositivo_a)
+        self.dispositivo_a.refresh_from_db()
+        self.assertEqual(
+            self.dispositivo_a.token_lookup, Dispositivo.calcular_token_lookup(self.token_a)
+        )
+        self.assertIsNone(self.dispositivo_a.token_hash)
+
+    def test_loop_legacy_solo_hashea_filas_con_hash_y_carga_solo_el_match(self):
+        """Un dispositivo sin token (ni lookup ni hash) no entra al loop; el
+        legacy real se compara como tupla y solo el match se carga entero."""
+        Dispositivo.objects.create(naviera=self.naviera_a, nave=self.nave_a, nombre="Sin tatuar")
+        hash_legacy = make_password(self.token_a)
+        Dispositivo.objects.filter(pk=self.dispositivo_a.pk).update(token_lookup=None, token_hash=hash_legacy)
+        with patch("sitrep.fleet.services.check_password", wraps=check_password) as check:
+            with self.assertNumQueries(2):
+                self.assertIsNone(
+                    FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, "token-que-no-es")
+                )
+            check.assert_called_once_with("token-que-no-es", hash_legacy)
+            check.reset_mock()
+            # Las mismas 2 queries, más el UPDATE del lookup y un único get del match.
+            with self.assertNumQueries(4):
+                d = FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, self.token_a)
+            check.assert_called_once_with(self.token_a, hash_legacy)
+        self.assertEqual(d, self.dispositivo_a)
+
+    def test_token_nuevo_no_usa_hasher_de_passwords(self):
+        """Tokens aleatorios de 256 bits: basta comparar el HMAC, sin hasher lento."""
+        with patch("sitrep.fleet.services.check_password") as check:
+            d = FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, self.token_a)
+            self.assertIsNone(FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, "token-que-no-es"))
+        self.assertEqual(d, self.dispositivo_a)
+        check.assert_not_called()
+        self.assertIsNone(self.dispositivo_a.token_hash)
+
+    def test_rotar_clave_con_fallback_reindexa_el_dispositivo(self):
+        """La clave anterior en DISPOSITIVO_TOKEN_KEY_FALLBACKS mantiene entrando
+        a los tablets; el primer login los deja indexados con la clave nueva."""
+        with self.settings(DISPOSITIVO_TOKEN_KEY="clave-nueva", DISPOSITIVO_TOKEN_KEY_FALLBACKS=[settings.SECRET_KEY]):
+            d = FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, self.token_a)
+            self.assertEqual(d, self.dispositivo_a)
+            self.dispositivo_a.refresh_from_db()
+            self.assertEqual(
+                bytes(self.dispositivo_a.token_lookup),
+                Dispositivo.calcular_token_lookup(self.token_a, "clave-nueva"),
+            )
+        with self.settings(DISPOSITIVO_TOKEN_KEY="clave-nueva"):
+            with self.assertNumQueries(1):
+                d = FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, self.token_a)
+            self.assertEqual(d, self.dispositivo_a)
+
+    def test_rotar_secret_key_sin_clave_propia_usa_secret_key_fallbacks(self):
+        clave_vieja = settings.SECRET_KEY
+        with self.settings(SECRET_KEY="secret-nueva", DISPOSITIVO_TOKEN_KEY="secret-nueva",
+                           SECRET_KEY_FALLBACKS=[clave_vieja]):
+            d = FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, self.token_a)
+        self.assertEqual(d, self.dispositivo_a)
+
+    def test_rotar_clave_sin_fallback_deja_al_dispositivo_afuera(self):
+        with self.settings(DISPOSITIVO_TOKEN_KEY="clave-nueva"):
+            self.assertIsNone(FleetQueryService.buscar_dispositivo_por_token(self.naviera_a.id, self.token_a))
+
 
 class TestVerificarDispositivoEndpoint(TenantFixturesMixin, TestCase):
     def setUp(self):
@@ -10,6 +10,7 @@ class MatrizNaveRecursoAdmin(admin.ModelAdmin):
         "ultimo_estado_operativo", "ultimo_estado_operativo_anterior",
         "es_fallo_nuevo",
     )
+    list_select_related = ("nave", "recurso")
     readonly_fields = ("ultimo_estado_operativo_en",)
     list_filter = ("nave__naviera", "es_visible")
     search_fields = ("nave__nombre", "recurso__nombre")
@@ -18,14 +19,17 @@ class MatrizNaveRecursoAdmin(admin.ModelAdmin):
 @admin.register(FichaRegistro)
 class FichaRegistroAdmin(admin.ModelAdmin):
     list_display = ("recurso", "periodo", "usuario", "estado_operativo", "fecha_revision", "fue_modificada")
+    list_select_related = ("recurso", "periodo__nave", "periodo__periodicidad", "usuario__naviera")
     list_filter = ("estado_operativo", "periodo__nave__naviera", "periodo__nave")
     search_fields = ("recurso__nombre", "usuario__rut")
     readonly_fields = ("fecha_revision", "modificado_en", "definicion_checklist")
 
     def fue_modificada(self, obj):
-        return obj.modificado_por is not None
+        return obj.modificado_por_id is not None
     fue_modificada.boolean = True
     fue_modificada.short_description = "Modificada"
 
 
-admin.site.register(PeriodoRevision)
+@admin.register(PeriodoRevision)
+class PeriodoRevisionAdmin(admin.ModelAdmin):
+    list_select_related = ("nave", "periodicidad")
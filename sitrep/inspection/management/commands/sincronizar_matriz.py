@@ -1,5 +1,6 @@
 ﻿import logging
 import time
+from itertools import groupby
 
 from django.core.management.base import BaseCommand
 from django.db import OperationalError, connections
@@ -51,23 +52,26 @@ class Command(BaseCommand):
             naves = [nave]
             self.stdout.write(f"Iniciando sincronización de matriz para nave id={nave_id}...")
         else:
-            naves = Nave.objects.filter(is_active=True).select_related("naviera")
+            naves = Nave.objects.filter(is_active=True).select_related("naviera").order_by("naviera_id", "id")
             self.stdout.write("Iniciando sincronización de matrices para todas las naves activas...")
 
-        for nave in naves:
+        # Una pasada en lote por naviera (catálogo, matrices y escritura
+        # compartidos); un error invalida solo el lote de esa naviera.
+        for naviera_id, lote in groupby(naves, key=lambda nave: nave.naviera_id):
+            lote = list(lote)
             try:
-                nave_stats = MotorReglasSITREP.sincronizar_matriz_nave(nave)
-                stats["naves_procesadas"] += 1
-                stats["recursos_creados"] += nave_stats["recursos_creados"]
-                stats["recursos_actualizados"] += nave_stats["recursos_actualizados"]
-                stats["recursos_omitidos"] += nave_stats["recursos_omitidos"]
-                stats["recursos_con_error"] += nave_stats["recursos_con_error"]
+                lote_stats = MotorReglasSITREP.sincronizar_matrices_naves(lote)
+                stats["naves_procesadas"] += len(lote)
+                stats["recursos_creados"] += lote_stats["recursos_creados"]
+                stats["recursos_actualizados"] += lote_stats["recursos_actualizados"]
+                stats["recursos_omitidos"] += lote_stats["recursos_omitidos"]
+                stats["recursos_con_error"] += lote_stats["recursos_con_error"]
             except Exception as exc:
                 logger.error(
-                    f"Error processing nave {nave.id} (Naviera: {nave.naviera_id}): {str(exc)}",
+                    f"Error processing naves {[nave.id for nave in lote]} (Naviera: {naviera_id}): {str(exc)}",
                     exc_info=True,
                 )
-                stats["naves_con_error"] += 1
+                stats["naves_con_error"] += len(lote)
 
         self.stdout.write(f"Naves procesadas: {stats['naves_procesadas']}")
         self.stdout.write(f"Recursos creados: {stats['recursos_creados']}")
@@ -1,5 +1,6 @@
 ﻿import bisect
 import logging
+from collections import defaultdict
 from datetime import timedelta
 from django.db import IntegrityError, transaction
 from django.db.models import Exists, F, OuterRef
@@ -193,6 +194,11 @@ class MotorReglasSITREP:
     # ponytail: evaluar_regla delegated to CatalogRuleEngine after catalog segregation
     evaluar_regla = CatalogRuleEngine.evaluar_regla
 
+    # Lo único que la sync lee de cada Recurso (más lo que el resolver usa para
+    # repartir capas y lineages); requerimientos y el resto de los JSON/textos
+    # pesados del catálogo no viajan.
+    CAMPOS_RECURSO = ('id', 'linaje_raiz_id', 'activo', 'naviera_id', 'nave_id', 'regla_aplicacion')
+
     @classmethod
     def sincronizar_matriz_nave(cls, nave, crear_nuevos=True):
         """
@@ -200,61 +206,145 @@ class MotorReglasSITREP:
         (nave > naviera > central). El motor de reglas es la única fuente de
         verdad: siempre recalcula cantidad/es_visible, sin excepciones manuales.
         Con crear_nuevos=False solo actualiza entradas existentes (útil en señales reactivas).
+
+        En lote: una query para las filas existentes, la evaluación de reglas en
+        memoria, y al final un bulk_create + un bulk_update — no un round-trip por
+        recurso. Un recurso cuya regla falla al evaluarse se loguea y se salta.
         """
-        stats = {'recursos_creados': 0, 'recursos_actualizados': 0, 'recursos_omitidos': 0, 'recursos_con_error': 0}
+        stats = cls._stats_vacios()
+        matrices_existentes = cls._matrices_existentes().filter(nave=nave)
+        recursos_efectivos = CatalogoResolver.catalogo_efectivo(nave, campos=cls.CAMPOS_RECURSO)
+        a_crear, a_actualizar, campos_actualizados = cls._planificar_matriz(
+            nave, recursos_efectivos, matrices_existentes, crear_nuevos, stats,
+        )
+        cls._aplicar_matriz(a_crear, a_actualizar, campos_actualizados)
+        return stats
 
-        recursos_efectivos = CatalogoResolver.catalogo_efectivo(nave)
+    @classmethod
+    def sincronizar_matrices_naves(cls, naves, crear_nuevos=True):
+        """
+        sincronizar_matriz_nave para varias naves a la vez (ej. todas las de una
+        naviera tras publicar el catálogo): una query de catálogo, una de
+        matrices existentes y un solo bulk_create/bulk_update para el conjunto,
+        en vez de repetir todo eso por nave. Las naves deben venir con
+        select_related('naviera'). Retorna los stats sumados.
+        """
+        naves = list(naves)
+        stats = cls._stats_vacios()
+        if not naves:
+            return stats
+
+        catalogos = CatalogoResolver.catalogos_efectivos(naves, campos=cls.CAMPOS_RECURSO)
+        matrices_por_nave = defaultdict(list)
+        for matriz in cls._matrices_existentes().filter(nave__in=naves):
+            matrices_por_nave[matriz.nave_id].append(matriz)
+
+        # Una compilación por Recurso para todo el lote: compilar_regla
+        # serializa la regla a JSON para buscarla en su cache, y eso por cada
+        # par (nave, recurso) costaría más que evaluarla.
+        evaluadores = {}
+
+        def evaluar(nave, recurso):
+            evaluador = evaluadores.get(recurso.id)
+            if evaluador is None:
+                evaluador = evaluadores[recurso.id] = CatalogRuleEngine.compilar_regla(recurso.regla_aplicacion)
+            return evaluador(nave)
+
+        a_crear, a_actualizar, campos_actualizados = [], [], set()
+        for nave in naves:
+            crear, actualizar, campos = cls._planificar_matriz(
+                nave, catalogos[nave.id], matrices_por_nave[nave.id], crear_nuevos, stats, evaluar,
+            )
+            a_crear.extend(crear)
+            a_actualizar.extend(actualizar)
+            campos_actualizados |= campos
+        cls._aplicar_matriz(a_crear, a_actualizar, campos_actualizados)
+        return stats
+
+    @staticmethod
+    def _stats_vacios():
+        return {'recursos_creados': 0, 'recursos_actualizados': 0, 'recursos_omitidos': 0, 'recursos_con_error': 0}
+
+    @staticmethod
+    def _matrices_existentes():
+        return (
+            MatrizNaveRecurso.objects
+            .select_related('recurso')
+            .only('id', 'nave_id', 'recurso_id', 'cantidad', 'es_visible', 'recurso__linaje_raiz')
+        )
+
+    @classmethod
+    def _planificar_matriz(cls, nave, recursos_efectivos, matrices_existentes, crear_nuevos, stats, evaluar=None):
+        """Compara el catálogo efectivo de UNA nave con sus filas de matriz y
+        retorna (a_crear, a_actualizar, campos_actualizados) sin tocar la BD.
+        evaluar(nave, recurso) -> (cantidad, es_visible); por defecto evaluar_regla."""
+        if evaluar is None:
+            def evaluar(nave, recurso):
+                return cls.evaluar_regla(nave, recurso.regla_aplicacion)
 
-        matrices_existentes = MatrizNaveRecurso.objects.filter(nave=nave).select_related('recurso')
         matriz_por_raiz = {
             (m.recurso.linaje_raiz_id or m.recurso_id): m for m in matrices_existentes
         }
 
+        a_crear = []
+        a_actualizar = []
+        campos_actualizados = set()
         raices_efectivas = set()
         for recurso in recursos_efectivos:
             raiz_id = recurso.linaje_raiz_id or recurso.id
             raices_efectivas.add(raiz_id)
             try:
-                with transaction.atomic():
-                    cantidad_calc, visible_calc = cls.evaluar_regla(nave, recurso.regla_aplicacion)
-                    matriz_existente = matriz_por_raiz.get(raiz_id)
-
-                    if matriz_existente is not None:
-                        campos = []
-                        if matriz_existente.recurso_id != recurso.id:
-                            matriz_existente.recurso = recurso
-                            campos.append('recurso')
-                        if matriz_existente.cantidad != cantidad_calc:
-                            matriz_existente.cantidad = cantidad_calc
-                            campos.append('cantidad')
-                        if matriz_existente.es_visible != visible_calc:
-                            matriz_existente.es_visible = visible_calc
-                            campos.append('es_visible')
-                        if campos:
-                            matriz_existente.save(update_fields=campos)
-                        stats['recursos_actualizados'] += 1
-                        continue
-
-                    if not crear_nuevos:
-                        stats['recursos_omitidos'] += 1
-                        continue
-
-                    MatrizNaveRecurso.objects.create(
-                        nave=nave, recurso=recurso, cantidad=cantidad_calc, es_visible=visible_calc,
-                    )
-                    stats['recursos_creados'] += 1
+                cantidad_calc, visible_calc = evaluar(nave, recurso)
             except Exception:
                 logger.error("Error processing recurso %s for nave %s (Naviera: %s)",
                               recurso.id, nave.id, nave.naviera_id, exc_info=True)
                 stats['recursos_con_error'] += 1
+                continue
+
+            matriz_existente = matriz_por_raiz.get(raiz_id)
+            if matriz_existente is not None:
+                campos = []
+                if matriz_existente.recurso_id != recurso.id:
+                    matriz_existente.recurso = recurso
+                    campos.append('recurso')
+                if matriz_existente.cantidad != cantidad_calc:
+                    matriz_existente.cantidad = cantidad_calc
+                    campos.append('cantidad')
+                if matriz_existente.es_visible != visible_calc:
+                    matriz_existente.es_visible = visible_calc
+                    campos.append('es_visible')
+                if campos:
+                    a_actualizar.append(matriz_existente)
+                    campos_actualizados.update(campos)
+                stats['recursos_actualizados'] += 1
+                continue
+
+            if not crear_nuevos:
+                stats['recursos_omitidos'] += 1
+                continue
+
+            a_crear.append(MatrizNaveRecurso(
+                nave=nave, recurso=recurso, cantidad=cantidad_calc, es_visible=visible_calc,
+            ))
+            stats['recursos_creados'] += 1
 
         for raiz_id, matriz in matriz_por_raiz.items():
             if raiz_id not in raices_efectivas and matriz.es_visible:
                 matriz.es_visible = False
-                matriz.save(update_fields=['es_visible'])
+                a_actualizar.append(matriz)
+                campos_actualizados.add('es_visible')
                 stats['recursos_actualizados'] += 1
 
-        return stats
+        return a_crear, a_actualizar, campos_actualizados
+
+    @staticmethod
+    def _aplicar_matriz(a_crear, a_actualizar, campos_actualizados):
+        with transaction.atomic():
+            # ignore_conflicts: otra sync concurrente de la misma nave pudo
+            # insertar la fila entre la lectura y acá (unique nave+recurso).
+            MatrizNaveRecurso.objects.bulk_create(a_crear, batch_size=500, ignore_conflicts=True)
+            if a_actualizar:
+                MatrizNaveRecurso.objects.bulk_update(a_actualizar, sorted(campos_actualizados), batch_size=500)
 
 
 class MotorPeriodos:
@@ -376,8 +466,13 @@ class MotorPeriodos:
             'periodos_con_error': 0,
         }
         hoy = timezone.localdate()
+        # La matriz depende de la nave y del catálogo, no de la periodicidad:
+        # con varias periodicidades rotando en el mismo tick (o la nave recién
+        # creada) basta sincronizarla una vez.
+        matriz_sincronizada = False
 
         for periodicidad in Periodicidad.objects.all():
+            sincronizada_en_esta_vuelta = False
             try:
                 with transaction.atomic():
                     periodo_abierto = (
@@ -395,7 +490,9 @@ class MotorPeriodos:
                     if periodo_abierto is None:
                         # Cambio de período (uno recién nacido): recién acá se
                         # sincroniza la matriz, no en cada tick del cron.
-                        MotorReglasSITREP.sincronizar_matriz_nave(nave)
+                        if not matriz_sincronizada:
+                            MotorReglasSITREP.sincronizar_matriz_nave(nave)
+                            matriz_sincronizada = sincronizada_en_esta_vuelta = True
                         cls._crear_periodo_abierto(nave, periodicidad, hoy)
                         stats['periodos_creados'] += 1
                         continue
@@ -409,7 +506,9 @@ class MotorPeriodos:
                         cls._cerrar_periodo(periodo_abierto)
                         stats['periodos_vencidos'] += 1
 
-                        MotorReglasSITREP.sincronizar_matriz_nave(nave)
+                        if not matriz_sincronizada:
+                            MotorReglasSITREP.sincronizar_matriz_nave(nave)
+                            matriz_sincronizada = sincronizada_en_esta_vuelta = True
                         cls._crear_periodo_abierto(nave, periodicidad, hoy)
                         stats['periodos_creados'] += 1
                         continue
@@ -419,6 +518,9 @@ class MotorPeriodos:
                         periodo_abierto.estado = estado_actual
                         periodo_abierto.save(update_fields=["estado"])
             except Exception:
+                # El rollback también deshizo la sync de esta vuelta.
+                if sincronizada_en_esta_vuelta:
+                    matriz_sincronizada = False
                 logger.error(
                     "Error processing periodicidad %s for nave %s (Naviera: %s)",
                     periodicidad.id, nave.id, nave.naviera_id,
@@ -7,7 +7,7 @@ from .services import MotorPeriodos
 logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=Nave)
-def trigger_sincronizacion(sender, instance, created, **kwargs):
+def trigger_sincronizacion(sender, instance, created, raw=False, **kwargs):
     """
     Al crear una nave activa, inicializa su MatrizNaveRecurso y sus
     PeriodoRevision. Ediciones posteriores (ej. desde admin) NO resincronizan:
@@ -15,7 +15,14 @@ def trigger_sincronizacion(sender, instance, created, **kwargs):
     resincronizar en cada guardado la rompería. La sync solo vuelve a ocurrir
     en cambio de período (MotorPeriodos) o de forma explícita (acción de
     admin / management command sincronizar_matriz).
+
+    Guardados raw (loaddata / fixtures) tampoco sincronizan: la nave llega
+    con sus filas relacionadas en el mismo dump, y correr el motor por cada
+    nave importada es trabajo tirado. Se mantiene síncrono a propósito: la
+    nave recién creada debe tener períodos al volver del request.
     """
+    if raw:
+        return
     if created and instance.is_active:
         try:
             MotorPeriodos.sincronizar_periodos_nave(instance)
@@ -1,13 +1,15 @@
 from datetime import date, datetime, timedelta
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from unittest.mock import patch
 
 from sitrep.accounts.models import Naviera, Usuario
 from sitrep.fleet.models import Nave, Tripulacion
 from sitrep.catalog.models import Area, Periodicidad, Recurso, CatalogoVersion
-from sitrep.catalog.services import requerimientos_estandar, CatalogoEditorService, CatalogoResolver
+from sitrep.catalog.services import requerimientos_estandar, CatalogoEditorService, CatalogoResolver, CatalogRuleEngine
 from .models import (
     FichaRegistro,
     MatrizNaveRecurso,
@@ -189,21 +191,17 @@ class TestMotorReglasSITREP(TestCase):
         )
         recurso_falla = self._crear_recurso(
             nombre="Recurso Falla",
-            regla_aplicacion=self.regla_semanal,
+            regla_aplicacion={"falla": True},
         )
 
-        original_create = MatrizNaveRecurso.objects.create
+        evaluar_original = MotorReglasSITREP.evaluar_regla
 
-        def create_con_fallo(*args, **kwargs):
-            if kwargs.get("recurso") == recurso_falla:
+        def evaluar_con_fallo(nave, regla_json):
+            if regla_json == {"falla": True}:
                 raise RuntimeError("fallo simulado de recurso")
-            return original_create(*args, **kwargs)
+            return evaluar_original(nave, regla_json)
 
-        with patch.object(
-            MatrizNaveRecurso.objects,
-            "create",
-            side_effect=create_con_fallo,
-        ):
+        with patch.object(MotorReglasSITREP, "evaluar_regla", side_effect=evaluar_con_fallo):
             with self.assertLogs("sitrep.inspection.services", level="ERROR") as logs:
                 stats = MotorReglasSITREP.sincronizar_matriz_nave(self.nave)
 
@@ -219,6 +217,79 @@ class TestMotorReglasSITREP(TestCase):
         )
         self.assertTrue(any("Error processing recurso" in linea for linea in logs.output))
 
+    def test_sincronizar_matriz_nave_queries_no_crecen_con_el_catalogo(self):
+        """Crear/actualizar la matriz es en lote: agregar recursos al catálogo
+        no agrega round-trips a la sync."""
+        for i in range(3):
+            self._crear_recurso(nombre=f"Recurso {i}", regla_aplicacion=self.regla_semanal)
+        with self.assertNumQueries(5):
+            MotorReglasSITREP.sincronizar_matriz_nave(self.nave)
+
+        for i in range(3, 10):
+            self._crear_recurso(nombre=f"Recurso {i}", regla_aplicacion=self.regla_semanal)
+        MatrizNaveRecurso.objects.filter(nave=self.nave).update(cantidad=99)
+        with self.assertNumQueries(6):
+            MotorReglasSITREP.sincronizar_matriz_nave(self.nave)
+        self.assertEqual(MatrizNaveRecurso.objects.filter(nave=self.nave, cantidad=2).count(), 10)
+
+    def test_sincronizar_matriz_nave_no_trae_requerimientos_del_catalogo(self):
+        """La sync solo lee regla_aplicacion (y lo que el resolver necesita);
+        requerimientos, el JSON pesado del catálogo, no viaja."""
+        self._crear_recurso(nombre="Recurso", regla_aplicacion=self.regla_semanal)
+        with CaptureQueriesContext(connection) as queries:
+            MotorReglasSITREP.sincronizar_matriz_nave(self.nave)
+        consulta_catalogo = next(q["sql"] for q in queries if 'FROM "catalog_recurso"' in q["sql"])
+        self.assertIn("regla_aplicacion", consulta_catalogo)
+        self.assertNotIn("requerimientos", consulta_catalogo)
+        self.assertEqual(MatrizNaveRecurso.objects.get(nave=self.nave).cantidad, 2)
+
+    def test_sincronizar_matrices_naves_en_lote_equivale_a_sync_por_nave(self):
+        """Varias naves en una pasada: mismas filas que sincronizar de a una, con
+        un número de queries que no depende de cuántas naves entren al lote."""
+        chica = Nave.objects.create(
+            naviera=self.naviera, nombre="Chica", matricula="NVM-002",
+            eslora=5.0, arqueo_bruto=10, capacidad_personas=2,
+        )
+        grande = Nave.objects.create(
+            naviera=self.naviera, nombre="Grande", matricula="NVM-003",
+            eslora=80.0, arqueo_bruto=900, capacidad_personas=60,
+        )
+        for i in range(3):
+            self._crear_recurso(nombre=f"Recurso {i}", regla_aplicacion=self.regla_semanal)
+        naves = list(Nave.objects.filter(naviera=self.naviera).select_related("naviera"))
+
+        with self.assertNumQueries(5):
+            stats = MotorReglasSITREP.sincronizar_matrices_naves(naves)
+        self.assertEqual(stats["recursos_creados"], 9)
+        for nave, cantidad in ((self.nave, 2), (chica, 0), (grande, 4)):
+            self.assertEqual(
+                set(MatrizNaveRecurso.objects.filter(nave=nave).values_list("cantidad", flat=True)),
+                {cantidad},
+            )
+
+        self.assertEqual(
+            MotorReglasSITREP.sincronizar_matrices_naves(naves)["recursos_actualizados"], 9
+        )
+        self.assertEqual(MatrizNaveRecurso.objects.count(), 9)
+
+    def test_sincronizar_matrices_naves_compila_cada_regla_una_vez_por_lote(self):
+        for i in range(3):
+            Nave.objects.create(
+                naviera=self.naviera, nombre=f"Nave {i}", matricula=f"NVM-1{i}",
+                eslora=5.0 + 20 * i, arqueo_bruto=10, capacidad_personas=2,
+            )
+        for i in range(2):
+            self._crear_recurso(nombre=f"Recurso {i}", regla_aplicacion=self.regla_semanal)
+        naves = Nave.objects.filter(naviera=self.naviera).select_related("naviera")
+
+        with patch.object(
+            CatalogRuleEngine, "compilar_regla", side_effect=CatalogRuleEngine.compilar_regla
+        ) as compilar:
+            MotorReglasSITREP.sincronizar_matrices_naves(naves)
+
+        self.assertEqual(compilar.call_count, 2)
+        self.assertEqual(MatrizNaveRecurso.objects.filter(recurso__nombre="Recurso 0").count(), 4)
+
 
 class TestSincronizarMatrizNaveVersionado(TestCase):
     def setUp(self):
@@ -610,6 +681,23 @@ class TestMotorPeriodosEstados(TestCase):
 
         mock_sync.assert_called_once_with(self.nave)
 
+    def test_sincronizar_periodos_nave_sincroniza_matriz_una_vez_aunque_roten_varias(self):
+        """Varias periodicidades abriendo período en el mismo tick comparten una
+        sola sync de matriz; cada una igual obtiene su período."""
+        for nombre in ("Mensual Estados", "Anual Estados"):
+            Periodicidad.objects.create(
+                nombre=nombre, duracion_dias=30, offset_dias=1,
+                responsabilidad="mar", visibilidad="todos",
+            )
+        self.periodo.fecha_termino = timezone.localdate() - timedelta(days=5)
+        self.periodo.save(update_fields=["fecha_termino"])
+
+        with patch.object(MotorReglasSITREP, "sincronizar_matriz_nave") as mock_sync:
+            stats = MotorPeriodos.sincronizar_periodos_nave(self.nave)
+
+        mock_sync.assert_called_once_with(self.nave)
+        self.assertEqual(stats["periodos_creados"], 3)
+
 
 class TestIntegracionMotorReglas(TestCase):
     REGLA_POR_ESLORA = {
@@ -764,6 +852,18 @@ class TestIntegracionMotorReglas(TestCase):
         self.assertEqual(matriz.cantidad, 2)
         self.assertTrue(matriz.es_visible)
 
+    def test_guardado_raw_de_nave_no_sincroniza(self):
+        """loaddata/fixtures guardan con raw=True: la nave trae sus filas en el
+        mismo dump, el signal no corre el motor."""
+        nave = Nave(
+            naviera=self.naviera, nombre="Nave Fixture", matricula="INT-099",
+            eslora=20, arqueo_bruto=100, capacidad_personas=10, agregado_en=timezone.now(),
+        )
+        with patch.object(MotorPeriodos, "sincronizar_periodos_nave") as mock_sync:
+            nave.save_base(raw=True)
+
+        mock_sync.assert_not_called()
+
     def test_editar_nave_no_resincroniza_matriz_automaticamente(self):
         """Editar una nave existente (ej. desde admin) NO debe resincronizar su
         matriz: eso rompería la inmutabilidad de fichas ya abiertas. La sync